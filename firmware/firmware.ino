@@ -3,11 +3,11 @@
   Target: 8 kHz sample rate, up to 10 s (80k samples ~160 KB)
   Mic pin: PC9
 
-  Protocol unchanged:
+  Protocol:
     Host sends:   REC,<sr_hz>,<num_samples>
 
-    Device sends: DATA,<num_samples>
- + <binary int16 LE samples> + DONE
+    Device sends: ACK
+                  "DATA" + <uint32 LE num_samples> + <binary int16 LE samples> + DONE
 
   Notes:
     - Allocates capture buffer on demand to conserve SRAM
@@ -138,8 +138,12 @@ void record_then_send(uint32_t sr, uint32_t n){
   }
 
   // --- bulk transmit ---
-  Serial.print(F("DATA,"));
-  Serial.println(n);
+  // Binary header: "DATA" magic then the sample count as uint32 LE, so the
+  // host can parse it with a single fixed-size unpack.
+  uint8_t header[8] = {'D', 'A', 'T', 'A',
+                       (uint8_t)(n & 0xFF), (uint8_t)((n >> 8) & 0xFF),
+                       (uint8_t)((n >> 16) & 0xFF), (uint8_t)((n >> 24) & 0xFF)};
+  Serial.write(header, sizeof(header));
 
   uint32_t sent = 0;
   while(sent < n){
@@ -1,19 +1,25 @@
 """
 XIAO MG24 Sense USB-CDC audio recorder GUI
 - Sends REC,<sr>,<n> to the board
-- Receives DATA,<n> header then <n> int16 samples (little-endian)
+- Receives a binary "DATA" + uint32 <n> header then <n> int16 samples
+  (all little-endian)
 - Plots waveform, can play audio and save WAV
 
 Dependencies: pip install dearpygui pyserial numpy sounddevice
-Optional (for saving WAV without external libs we use stdlib wave)
+Optional: pyudev (Linux) to refresh the port list when a board is plugged in
+WAV files are written directly (hand-built header + memory-mapped samples),
+so no extra audio library is needed for saving.
 """
 
+import os
 import sys
+import re
+import select
+import array
 import time
 import math
 import threading
 import struct
-import wave
 from typing import Optional
 import queue
 
@@ -26,16 +32,44 @@ import dearpygui.dearpygui as dpg
 # ----------------- Serial helpers -----------------
 
 DEVICE_MAX_SR = 8000
+MAX_RECORD_SECONDS = 30.0
+
+# Host-side serial buffering for audio payloads
+RX_BUFFER_SIZE = 1 << 20
+# A read of at least one full-speed USB packet means bulk data is flowing
+RX_BURST_BYTES = 64
+RX_BURST_DELAY = 0.002
+# Direct descriptor reads (POSIX): largest single read, and how often the
+# reader wakes up to check whether it should stop
+RX_READ_MAX = 1 << 16
+RX_POLL_INTERVAL = 0.1
+
+# Binary frame header: b"DATA" magic followed by the sample count (uint32 LE)
+_DATA_MAGIC = b"DATA"
+_DATA_HEADER = struct.Struct("<4sI")
+# Acknowledgement line as sent by the firmware (Serial.println)
+_ACK_LINE = b"ACK\r\n"
+_ERROR_RE = re.compile(rb"(?:^|\n)(ERR[^\r\n]*)\r?\n")
 
 def list_serial_ports():
-    ports = list_ports.comports()
     # Prefer CDC ACM/USB devices first
-    ports_sorted = sorted(ports, key=lambda p: ("USB" not in (p.description or ""), p.device))
-    return [f"{p.device} — {p.description}".strip() for p in ports_sorted], [p.device for p in ports_sorted]
+    entries = sorted(
+        ((p.device, p.description or "") for p in list_ports.comports()),
+        key=lambda entry: ("USB" not in entry[1], entry[0]),
+    )
+    labels = [f"{dev} — {desc}" if desc else dev for dev, desc in entries]
+    return labels, [dev for dev, _ in entries]
 
 
 def open_serial(port: str, timeout=2.0) -> serial.Serial:
     ser = serial.Serial(port=port, baudrate=115200, timeout=timeout)
+    ser.inter_byte_timeout = None
+    try:
+        # Windows only: give the driver room for a whole capture so bulk
+        # payload reads don't stall on a small default RX buffer.
+        ser.set_buffer_size(rx_size=RX_BUFFER_SIZE)
+    except AttributeError:
+        pass
     # Give the device a moment to enumerate; some cores reset on open
     time.sleep(0.25)
     # Flush any startup text like READY\n
@@ -44,20 +78,169 @@ def open_serial(port: str, timeout=2.0) -> serial.Serial:
     return ser
 
 
-def rec_once(ser: serial.Serial, sr: int, seconds: float) -> np.ndarray:
+class SerialReader:
+    """Keeps a serial port drained from a dedicated thread.
+
+    Received bytes are handed over as chunks through a SimpleQueue, so the
+    port keeps being emptied while the consumer is busy. The object offers
+    the subset of ``serial.Serial`` that rec_once needs and passes writes
+    straight through to the port.
+    """
+
+    def __init__(self, ser: serial.Serial):
+        self.ser = ser
+        self._chunks: "queue.SimpleQueue[bytes | Exception]" = queue.SimpleQueue()
+        self._buf = bytearray()
+        self._error: Optional[Exception] = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        read_block = self._fd_reader() or self._serial_read
+        while self._running:
+            try:
+                data = read_block()
+            except Exception as exc:
+                if self._running:
+                    self._chunks.put(exc)
+                return
+            if data:
+                self._chunks.put(data)
+                if len(data) >= RX_BURST_BYTES:
+                    # A payload burst is streaming in. Let the driver buffer
+                    # a few KB before the next read so each read (and queue
+                    # item) carries a larger block.
+                    time.sleep(RX_BURST_DELAY)
+
+    def _serial_read(self) -> bytes:
+        return self.ser.read(self.ser.in_waiting or 1)
+
+    def _fd_reader(self):
+        # POSIX ports expose their descriptor. Waiting on it with select()
+        # and taking everything buffered with one os.read() skips pyserial's
+        # per-call in_waiting ioctl and read bookkeeping. Other platforms
+        # (and test doubles) go through ser.read.
+        fileno = getattr(self.ser, "fileno", None)
+        if fileno is None or os.name != "posix":
+            return None
+        try:
+            fd = fileno()
+        except Exception:
+            return None
+
+        def read_fd() -> bytes:
+            ready, _, _ = select.select([fd], [], [], RX_POLL_INTERVAL)
+            if not ready:
+                return b""
+            data = os.read(fd, RX_READ_MAX)
+            if not data:
+                raise serial.SerialException("Device disconnected (read returned no data).")
+            return data
+
+        return read_fd
+
+    @property
+    def in_waiting(self) -> int:
+        self._pull(block=False)
+        return len(self._buf)
+
+    def _pull(self, block: bool, deadline: Optional[float] = None) -> bool:
+        # Move queued chunks into _buf, optionally waiting for the first one
+        # until `deadline`. Returns False if nothing arrived.
+        if self._error is not None:
+            raise self._error
+        pulled = False
+        while True:
+            try:
+                if block and not pulled:
+                    wait = None if deadline is None else deadline - time.monotonic()
+                    if wait is not None and wait <= 0:
+                        return False
+                    chunk = self._chunks.get(timeout=wait)
+                else:
+                    chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                return pulled
+            if isinstance(chunk, Exception):
+                self._error = chunk
+                raise chunk
+            self._buf += chunk
+            pulled = True
+
+    def _deadline(self) -> Optional[float]:
+        timeout = self.ser.timeout
+        return None if timeout is None else time.monotonic() + timeout
+
+    def read(self, size: int = 1) -> bytes:
+        deadline = self._deadline()
+        while len(self._buf) < size and self._pull(True, deadline):
+            pass
+        data = bytes(self._buf[:size])
+        del self._buf[:size]
+        return data
+
+    def readinto(self, b) -> int:
+        mv = memoryview(b).cast("B")
+        deadline = self._deadline()
+        got = 0
+        while got < len(mv):
+            if not self._buf and not self._pull(True, deadline):
+                break
+            k = min(len(self._buf), len(mv) - got)
+            with memoryview(self._buf) as view:
+                mv[got:got + k] = view[:k]
+            del self._buf[:k]
+            got += k
+        return got
+
+    def reset_input_buffer(self):
+        self.ser.reset_input_buffer()
+        self._buf.clear()
+        self._pull(block=False)
+        self._buf.clear()
+
+    def reset_output_buffer(self):
+        self.ser.reset_output_buffer()
+
+    def write(self, data: bytes):
+        return self.ser.write(data)
+
+    def flush(self):
+        self.ser.flush()
+
+    def close(self):
+        self._running = False
+        try:
+            self.ser.cancel_read()
+        except AttributeError:
+            pass
+        # Let the reader stop before the port (and its descriptor) goes away
+        self._thread.join(timeout=1.0)
+        self.ser.close()
+
+
+def rec_once(ser: serial.Serial, sr: int, seconds: float, out: Optional[np.ndarray] = None) -> np.ndarray:
     n = int(round(sr * seconds))
     cmd = f"REC,{sr},{n}\n".encode()
     # Discard any stray bytes from previous runs before issuing the command.
-    # Without this, stale binary audio from an earlier failed capture could
-    # appear before the ACK/DATA headers and trigger "Unexpected header"
-    # errors on the host side.
+    # Without this, stale payload bytes or a DONE line from an earlier failed
+    # capture could sit ahead of the ACK/DATA reply, and the header scan
+    # below could lock onto a "DATA" inside old audio.
     ser.reset_input_buffer()
+    # No flush(): the write has already handed the whole command to the
+    # driver, and tcdrain() would only add a syscall before we start reading.
     ser.write(cmd)
-    ser.flush()
 
-    # Expect: DATA,<n>\n
-    header = ""
-    ack_seen = False
+    # Expect: DATA<u32 n> (possibly after an ACK line). Reads are coalesced
+    # into one buffer and scanned for the header magic.
+    pending = bytearray()
+    # Happy path: the reply opens with exactly the firmware's ACK line and
+    # the header for the count we asked for. While what has arrived is still
+    # a prefix of that, the tolerant scan below is skipped; once it diverges
+    # (ERR, a stray line, another count) the scan takes over.
+    expected = _ACK_LINE + _DATA_HEADER.pack(_DATA_MAGIC, n)
+    fast = True
     # Allow the device at least the requested recording duration plus a
     # little slack to deliver the DATA header. The previous fixed attempt
     # counter caused a false timeout for long captures (e.g. 10 s) because
@@ -65,98 +248,241 @@ def rec_once(ser: serial.Serial, sr: int, seconds: float) -> np.ndarray:
     wait_budget = max(5.0, seconds + 2.0)
     wait_deadline = time.monotonic() + wait_budget
     while True:
-        raw = ser.readline()
-        if raw == b"":
-            if time.monotonic() > wait_deadline:
-                if ack_seen:
-                    raise RuntimeError("Device did not send DATA header after ACK.")
-                raise RuntimeError("Device did not send DATA header (only blank lines).")
-            continue
-
-        stripped = raw.strip()
-        if stripped == b"":
-            if time.monotonic() > wait_deadline:
-                if ack_seen:
-                    raise RuntimeError("Device did not send DATA header after ACK.")
-                raise RuntimeError("Device did not send DATA header (only blank lines).")
-            continue
-        if stripped.endswith(b"ACK"):
-            ack_seen = True
-            if time.monotonic() > wait_deadline:
-                raise RuntimeError("Device did not send DATA header after ACK.")
-            continue
-        idx = stripped.find(b"DATA,")
-        if idx != -1:
-            header_bytes = stripped[idx:]
-            try:
-                header = header_bytes.decode("ascii")
-            except UnicodeDecodeError:
-                pass
-            else:
+        if fast:
+            if pending.startswith(expected):
+                start = len(_ACK_LINE)
+                break
+            fast = expected.startswith(pending)
+        if not fast:
+            start = pending.find(_DATA_MAGIC)
+            if start != -1 and len(pending) >= start + _DATA_HEADER.size:
                 break
+            error = _ERROR_RE.search(pending)
+            if error:
+                preview = error.group(1).decode("ascii", errors="replace")
+                raise RuntimeError(f"Device reported an error: {preview!r}")
+        if time.monotonic() > wait_deadline:
+            if b"ACK" in pending:
+                raise RuntimeError("Device did not send DATA header after ACK.")
+            raise RuntimeError("Device did not send DATA header.")
+        pending += ser.read(ser.in_waiting or 1)
+
+    if not fast:
+        # Reject a count larger than the GUI could have asked for before
+        # allocating for it.
+        _, n_declared = _DATA_HEADER.unpack_from(pending, start)
+        if n_declared > max(n, int(DEVICE_MAX_SR * MAX_RECORD_SECONDS)):
+            raise RuntimeError(f"Malformed DATA header: declares {n_declared} samples")
+        if n_declared != n:
+            # not fatal; we'll honor the device's count
+            n = n_declared
+
+    # Read exactly n int16 little-endian samples straight into the array
+    # that is returned, so there is no intermediate bytearray. A caller
+    # supplied int16 buffer is reused when it is large enough.
+    if out is not None and out.size >= n:
+        data = out[:n]
+    else:
+        data = np.empty(n, dtype=np.int16)
+    byte_count = data.nbytes
+    mv = memoryview(data).cast("B")
+    # Payload bytes that arrived in the same read as the header
+    leftover = pending[start + _DATA_HEADER.size:]
+    got = min(len(leftover), byte_count)
+    mv[:got] = leftover[:got]
+    # Ask for everything that is still missing in one call; pyserial keeps
+    # reading until it has that much or the port timeout expires, so this
+    # loop normally runs once instead of once per USB packet.
+    while got < byte_count:
+        n_read = ser.readinto(mv[got:])
+        if not n_read:
+            raise TimeoutError("Timed out while reading audio bytes from device")
+        got += n_read
 
-        preview = stripped.decode("ascii", errors="replace")
-        raise RuntimeError(f"Unexpected header from device: {preview!r}")
+    # Drain the trailing DONE line if it has already arrived. Checking
+    # in_waiting avoids blocking without touching the port's timeout.
+    waiting = ser.in_waiting
+    if waiting:
+        ser.read(waiting)
+
+    return data
 
+
+# ----------------- Audio helpers -----------------
+
+# Frames per PortAudio buffer and per blocking write during playback
+# (128 ms at 8 kHz, which also bounds how long a stop request takes)
+PLAY_BLOCK = 1024
+
+# Canonical 44-byte header for mono 16-bit PCM
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+
+def write_wav(path: str, samples: np.ndarray, sr: int):
+    samples = np.ascontiguousarray(samples, dtype="<i2")
+    data_bytes = samples.nbytes
+    header = _WAV_HEADER.pack(
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, 1, sr, sr * 2, 2, 16,
+        b"data", data_bytes,
+    )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(_WAV_HEADER.size + data_bytes)
+    if not data_bytes:
+        return
+    # Copy the samples into the file through a memory map; the page cache
+    # takes them straight from the array with no intermediate bytes object.
+    mm = np.memmap(path, dtype="<i2", mode="r+", offset=_WAV_HEADER.size, shape=samples.shape)
+    mm[:] = samples
+    mm.flush()
+    # Drop the mapping now so the file isn't held open (matters on Windows)
+    del mm
+
+
+# ----------------- Plot helpers -----------------
+
+# Upper bound on points pushed to the waveform plot; a few thousand is
+# already more than the plot is wide in pixels.
+PLOT_MAX_POINTS = 2048
+
+def _time_axis(n: int, sr: int, points: Optional[int] = None) -> np.ndarray:
+    # float32 time stamps spanning n samples at sr, spread over `points` values
+    if points is None:
+        points = n
+    return np.linspace(0.0, (n - 1) / float(sr), points, dtype=np.float32)
+
+
+def _downsample_minmax(data: np.ndarray, target: int = PLOT_MAX_POINTS, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # Split into target // 2 near-equal buckets covering every sample and
+    # keep each bucket's min and max so peaks survive the reduction.
+    # reduceat works on the bucket boundaries directly, so nothing is
+    # trimmed or copied into a 2-D view first.
+    buckets = target // 2
+    starts = np.arange(buckets) * len(data) // buckets
+    y = np.empty(buckets * 2, dtype=data.dtype) if out is None else out[: buckets * 2]
+    y[0::2] = np.minimum.reduceat(data, starts)
+    y[1::2] = np.maximum.reduceat(data, starts)
+    return y
+
+
+def _set_line_series(tag: str, t: np.ndarray, y: np.ndarray):
+    t = np.ascontiguousarray(t, dtype=np.float32)
+    y = np.ascontiguousarray(y, dtype=np.float32)
     try:
-        n_declared = int(header.split(",", 1)[1])
+        # DearPyGui reads buffer-protocol objects directly, so no per-sample
+        # Python floats are created.
+        dpg.set_value(tag, [t, y])
     except Exception:
-        raise RuntimeError(f"Malformed DATA header: {header!r}")
+        # Fall back to packed float32 arrays for builds that reject ndarrays
+        dpg.set_value(tag, [array.array("f", t.tobytes()), array.array("f", y.tobytes())])
 
-    if n_declared != n:
-        # not fatal; we'll honor the device's count
-        n = n_declared
 
-    # Read exactly n int16 little-endian samples
-    byte_count = n * 2
-    buf = bytearray(byte_count)
-    mv = memoryview(buf)
-    got = 0
-    while got < byte_count:
-        chunk = ser.readinto(mv[got:])
-        if not chunk:
-            raise TimeoutError("Timed out while reading audio bytes from device")
-        got += chunk
+# ----------------- Dear PyGui app -----------------
 
-    # Optionally read trailing DONE line, but don't block if it's not there yet
-    prev_timeout = ser.timeout
-    try:
-        ser.timeout = 0
-        _ = ser.readline()  # best-effort
-    finally:
-        ser.timeout = prev_timeout
+# Status indicator colors
+_RECORD_IDLE = (110, 150, 210, 255)
+_RECORD_SUCCESS = (120, 210, 150, 255)
+_RECORD_ERROR = (230, 140, 90, 255)
+_RECORDING = (120, 200, 255, 255)
+_CONN_CONNECTED = (110, 200, 150, 255)
+_CONN_DISCONNECTED = (200, 90, 90, 255)
 
-    data = np.frombuffer(buf, dtype=np.int16)
-    return data
+# Indicator animations index precomputed color tables instead of evaluating
+# sin() and lerping channels every frame. A pulse table covers one period.
+_LUT_SIZE = 256
+_RECORD_PULSE_STEPS = 3.2 * _LUT_SIZE / (2 * math.pi)  # table steps per second
+_CONN_PULSE_STEPS = 1.25 * _LUT_SIZE / (2 * math.pi)
 
 
-# ----------------- Dear PyGui app -----------------
+def _pulse_lut(base: tuple, mix: tuple, depth: float = 0.6) -> list:
+    lut = []
+    for i in range(_LUT_SIZE):
+        wave = 0.5 + 0.5 * math.sin(2 * math.pi * i / _LUT_SIZE)
+        lut.append(tuple(int(b + (m - b) * wave * depth) for b, m in zip(base[:3], mix[:3])) + (255,))
+    return lut
+
+
+def _fade_lut(idle: tuple, flash: tuple) -> list:
+    # Entry i is the color at fade ratio i / (_LUT_SIZE - 1), 0 being idle
+    lut = []
+    for i in range(_LUT_SIZE):
+        ratio = i / (_LUT_SIZE - 1)
+        lut.append(tuple(int(a + (b - a) * ratio) for a, b in zip(idle[:3], flash[:3])) + (255,))
+    return lut
+
+
+_RECORDING_LUT = _pulse_lut(_RECORDING, (255, 255, 255))
+_CONN_LUT = _pulse_lut(_CONN_CONNECTED, (180, 235, 200))
+# The post-record flash always fades from one of the record colors to idle
+_FADE_LUTS = {
+    color: _fade_lut(_RECORD_IDLE, color)
+    for color in (_RECORD_IDLE, _RECORD_SUCCESS, _RECORD_ERROR, _RECORDING)
+}
+
 
 class App:
     def __init__(self):
-        self.ser: Optional[serial.Serial] = None
-        self.ports_labels, self.ports_devices = list_serial_ports()
+        self.ser: Optional[SerialReader] = None
+        # Filled in by a background scan; enumerating ports can block for a
+        # noticeable time on some platforms.
+        self.ports_labels: list = []
+        self.ports_devices: list = []
+        self._ports_thread: Optional[threading.Thread] = None
+        self._ports_queue: "queue.SimpleQueue[tuple[list, list, Optional[Exception]]]" = queue.SimpleQueue()
+        self._announce_ports: bool = False
+        # Set when the cached port list may be out of date (hotplug event or
+        # a refresh requested while a scan was already running)
+        self._ports_stale: bool = False
+        self._hotplug_observer = None
+        # Set to stop the active playback worker; the worker also sets it
+        # when it exits, so a set event means nothing is playing.
+        self._play_stop: Optional[threading.Event] = None
+        # Samples handed to the active playback worker
+        self._play_data: Optional[np.ndarray] = None
+        # Status text is pushed to the widget at most once per frame; any
+        # thread may call set_status.
+        self._status_text: str = "Idle"
+        self._status_dirty: bool = False
         self.current_samples: Optional[np.ndarray] = None
         self.current_sr: int = DEVICE_MAX_SR
+        # Plot data lives in fixed float32 buffers; captures longer than
+        # PLOT_MAX_POINTS are decimated, so that is all they ever need.
+        # _plot_x is only rebuilt when the capture shape changes.
+        self._plot_x = np.zeros(PLOT_MAX_POINTS, dtype=np.float32)
+        self._plot_y = np.zeros(PLOT_MAX_POINTS, dtype=np.float32)
+        self._plot_x_key: Optional[tuple] = None
+        self._axis_limits_pending: bool = False
+        # (samples, sr) and (y min, y max, pad) the axes were last fitted to
+        self._last_fit_key: Optional[tuple] = None
+        self._last_fit_y: Optional[tuple] = None
         self._record_thread: Optional[threading.Thread] = None
+        # Two capture buffers, each sized up front for the longest take the
+        # UI offers (480 KB) and only grown if a longer one is typed in.
+        # Captures go into _audio_bufs[_fill_idx]; the index flips when one
+        # succeeds, so current_samples (a view of the other buffer) stays
+        # intact for plotting, playback and saving while the next take runs.
+        # Playback of an older take still in the buffer about to be filled
+        # is stopped when recording starts.
+        self._audio_bufs = [
+            np.empty(int(DEVICE_MAX_SR * MAX_RECORD_SECONDS), dtype=np.int16) for _ in range(2)
+        ]
+        self._fill_idx: int = 0
         self._recording: bool = False
-        self._result_queue: "queue.Queue[tuple[Optional[np.ndarray], int, Optional[Exception]]]" = queue.Queue()
+        self._result_queue: "queue.SimpleQueue[tuple[Optional[np.ndarray], int, Optional[Exception]]]" = queue.SimpleQueue()
         self._record_start_time: float = 0.0
         self._record_duration: float = 0.0
         self._record_pulse: float = 0.0
         self._post_record_flash_until: float = 0.0
         self._post_record_flash_duration: float = 0.0
-        self._post_record_flash_color = (110, 150, 210, 255)
+        self._post_record_flash_color = _RECORD_IDLE
         self._connected: bool = False
         self._connected_port_label: str = ""
         self._conn_pulse: float = 0.0
+        # The connection dot only pulses as a heartbeat while connected
+        self._connected_pulse_active: bool = False
+        # Last value pushed per (item, attribute), to skip redundant DPG calls
+        self._dpg_cache: dict = {}
         self._last_frame_time: float = time.perf_counter()
-        self._record_color_idle = (110, 150, 210, 255)
-        self._record_color_success = (120, 210, 150, 255)
-        self._record_color_error = (230, 140, 90, 255)
-        self._record_color_recording = (120, 200, 255, 255)
-        self._conn_color_connected = (110, 200, 150, 255)
-        self._conn_color_disconnected = (200, 90, 90, 255)
 
         dpg.create_context()
         self._apply_theme()
@@ -174,7 +500,7 @@ class App:
                 with dpg.group():
                     dpg.add_text("Device", color=(149, 182, 255, 255))
                     with dpg.group(horizontal=True, horizontal_spacing=8):
-                        dpg.add_text("●", tag="conn_indicator", color=(200, 90, 90, 255))
+                        dpg.add_text("●", tag="conn_indicator", color=_CONN_DISCONNECTED)
                         dpg.add_text("Disconnected", tag="conn_label")
                 with dpg.group():
                     dpg.add_text("Session", color=(149, 182, 255, 255))
@@ -188,7 +514,7 @@ class App:
                             show=False,
                         )
                         dpg.add_text("Idle", tag="record_label")
-                        dpg.add_text("●", tag="record_indicator", color=(110, 150, 210, 255))
+                        dpg.add_text("●", tag="record_indicator", color=_RECORD_IDLE)
                     dpg.add_progress_bar(tag="record_progress", default_value=0.0, width=260, overlay="0%", show=False)
             dpg.add_spacer(height=10)
             with dpg.group(horizontal=True, horizontal_spacing=18):
@@ -216,7 +542,7 @@ class App:
                         tag="dur",
                         default_value=2.0,
                         min_value=0.1,
-                        max_value=30.0,
+                        max_value=MAX_RECORD_SECONDS,
                         width=-1,
                         format="%.2f",
                         label="Duration (s)",
@@ -257,6 +583,8 @@ class App:
 
         self._set_connection_state(False)
         self._set_record_visual_idle()
+        self._start_ports_refresh()
+        self._start_hotplug_monitor()
 
     # ---------- UI callbacks ----------
 
@@ -289,40 +617,58 @@ class App:
         dpg.bind_theme("app_theme")
 
     def set_status(self, txt: str):
-        dpg.set_value("status", txt)
+        self._status_text = txt
+        self._status_dirty = True
+
+    def _flush_status(self):
+        if self._status_dirty:
+            # Clear first so an update racing with this one shows next frame
+            self._status_dirty = False
+            dpg.set_value("status", self._status_text)
 
     def _set_connection_state(self, connected: bool, port_label: str = ""):
         self._connected = connected
         self._connected_port_label = port_label
+        self._connected_pulse_active = connected
         if connected:
             label = f"Connected ({port_label})" if port_label else "Connected"
-            color = self._conn_color_connected
+            color = _CONN_CONNECTED
         else:
             label = "Disconnected"
-            color = self._conn_color_disconnected
-        dpg.set_value("conn_label", label)
-        dpg.configure_item("conn_indicator", color=color)
+            color = _CONN_DISCONNECTED
+        self._set_cached("conn_label", label)
+        self._set_cached("conn_indicator", color, "color")
+
+    def _set_cached(self, item: str, value, attr: str = "value"):
+        key = (item, attr)
+        if key in self._dpg_cache and self._dpg_cache[key] == value:
+            return
+        self._dpg_cache[key] = value
+        if attr == "value":
+            dpg.set_value(item, value)
+        else:
+            dpg.configure_item(item, **{attr: value})
 
     def _set_record_visual_idle(self):
-        dpg.configure_item("record_spinner", show=False)
-        dpg.configure_item("record_progress", show=False)
-        dpg.set_value("record_label", "Idle")
-        dpg.configure_item("record_indicator", color=self._record_color_idle)
-        self._post_record_flash_color = self._record_color_idle
+        self._set_cached("record_spinner", False, "show")
+        self._set_cached("record_progress", False, "show")
+        self._set_cached("record_label", "Idle")
+        self._set_cached("record_indicator", _RECORD_IDLE, "color")
+        self._post_record_flash_color = _RECORD_IDLE
 
     def _set_record_visual_error(self):
-        dpg.configure_item("record_spinner", show=False)
-        dpg.configure_item("record_progress", show=False)
-        dpg.set_value("record_label", "Error")
-        dpg.configure_item("record_indicator", color=self._record_color_error)
-        self._post_record_flash_color = self._record_color_error
+        self._set_cached("record_spinner", False, "show")
+        self._set_cached("record_progress", False, "show")
+        self._set_cached("record_label", "Error")
+        self._set_cached("record_indicator", _RECORD_ERROR, "color")
+        self._post_record_flash_color = _RECORD_ERROR
 
     def _set_record_visual_success(self):
-        dpg.configure_item("record_spinner", show=False)
-        dpg.configure_item("record_progress", show=False)
-        dpg.set_value("record_label", "Captured")
-        dpg.configure_item("record_indicator", color=self._record_color_success)
-        self._post_record_flash_color = self._record_color_success
+        self._set_cached("record_spinner", False, "show")
+        self._set_cached("record_progress", False, "show")
+        self._set_cached("record_label", "Captured")
+        self._set_cached("record_indicator", _RECORD_SUCCESS, "color")
+        self._post_record_flash_color = _RECORD_SUCCESS
 
     def _set_recording_enabled(self, enabled: bool):
         dpg.configure_item("record_btn", enabled=enabled)
@@ -335,10 +681,9 @@ class App:
         return sr
 
     def on_refresh_ports(self):
-        labels, devs = list_serial_ports()
-        self.ports_labels, self.ports_devices = labels, devs
-        dpg.configure_item("port_combo", items=labels)
-        self.set_status("Ports refreshed.")
+        self._announce_ports = True
+        self.set_status("Refreshing ports…")
+        self._start_ports_refresh()
 
     def on_connect(self):
         if self.ser:
@@ -365,7 +710,7 @@ class App:
             display_label = label
 
         try:
-            self.ser = open_serial(port)
+            self.ser = SerialReader(open_serial(port))
             if not display_label:
                 display_label = port
             self._set_connection_state(True, display_label)
@@ -415,7 +760,6 @@ class App:
             self.set_status("Duration must be greater than zero.")
             return
 
-        self.current_sr = sr
         self._recording = True
         self._set_recording_enabled(False)
         self._record_start_time = time.perf_counter()
@@ -423,13 +767,13 @@ class App:
         self._record_pulse = 0.0
         self._post_record_flash_until = 0.0
         self._post_record_flash_duration = 0.0
-        self._post_record_flash_color = self._record_color_recording
-        dpg.configure_item("record_spinner", show=True)
-        dpg.configure_item("record_progress", show=True)
-        dpg.set_value("record_progress", 0.0)
-        dpg.configure_item("record_progress", overlay="0%")
-        dpg.set_value("record_label", "Recording…")
-        dpg.configure_item("record_indicator", color=self._record_color_recording)
+        self._post_record_flash_color = _RECORDING
+        self._set_cached("record_spinner", True, "show")
+        self._set_cached("record_progress", True, "show")
+        self._set_cached("record_progress", 0.0)
+        self._set_cached("record_progress", "0%", "overlay")
+        self._set_cached("record_label", "Recording…")
+        self._set_cached("record_indicator", _RECORDING, "color")
         if sr != requested_sr:
             dpg.set_value("sr", sr)
             status_msg = f"Recording {dur:.2f}s at {sr} Hz (device limit)."
@@ -437,22 +781,63 @@ class App:
             status_msg = f"Recording {dur:.2f}s at {sr} Hz…"
         self.set_status(status_msg)
 
-        thread = threading.Thread(target=self._record_worker, args=(sr, dur), daemon=True)
+        # Playback may still be streaming from the buffer about to be reused
+        playing = self._active_play_data()
+        if playing is not None and np.shares_memory(playing, self._audio_bufs[self._fill_idx]):
+            self._stop_playback()
+        thread = threading.Thread(target=self._record_worker, args=(sr, dur, self._fill_idx), daemon=True)
         self._record_thread = thread
         thread.start()
 
+    def _samples_int16(self) -> np.ndarray:
+        # rec_once already yields int16; only convert if something else
+        # ended up in current_samples.
+        samples = self.current_samples
+        if samples.dtype == np.int16:
+            return samples
+        return samples.astype(np.int16)
+
     def on_play(self):
         if self.current_samples is None:
             self.set_status("Nothing to play. Record first.")
             return
+        self._stop_playback()
         try:
             import sounddevice as sd
-            sd.stop()
-            sd.play(self.current_samples.astype(np.int16), self.current_sr)
-            # Don't block UI; let it play in background
-            self.set_status("Playing…")
+            stream = sd.OutputStream(
+                samplerate=self.current_sr,
+                channels=1,
+                dtype="int16",
+                blocksize=PLAY_BLOCK,
+                latency="high",
+            )
+            stream.start()
         except Exception as e:
             self.set_status(f"Playback error: {e} (install 'sounddevice'?)")
+            return
+        # Feed the stream from a worker with blocking writes, so no Python
+        # callback runs on the audio thread and the UI never waits on it.
+        stop = threading.Event()
+        data = self._samples_int16()
+        thread = threading.Thread(target=self._playback_worker, args=(stream, data, stop), daemon=True)
+        self._play_stop = stop
+        self._play_data = data
+        thread.start()
+        self.set_status("Playing…")
+
+    def _active_play_data(self) -> Optional[np.ndarray]:
+        # Forget a playback that already ended on its own
+        if self._play_stop is None or self._play_stop.is_set():
+            self._play_stop = None
+            self._play_data = None
+        return self._play_data
+
+    def _stop_playback(self):
+        # The worker notices between blocks and aborts its own stream
+        if self._play_stop is not None:
+            self._play_stop.set()
+            self._play_stop = None
+        self._play_data = None
 
     def on_save(self):
         if self.current_samples is None:
@@ -462,11 +847,7 @@ class App:
         ts = time.strftime("%Y%m%d_%H%M%S")
         fname = f"xiao_mg24_audio_{ts}.wav"
         try:
-            with wave.open(fname, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)  # int16
-                wf.setframerate(self.current_sr)
-                wf.writeframes(self.current_samples.astype(np.int16).tobytes())
+            write_wav(fname, self._samples_int16(), self.current_sr)
             self.set_status(f"Saved {fname}")
         except Exception as e:
             self.set_status(f"Save error: {e}")
@@ -474,6 +855,8 @@ class App:
     def on_clear(self):
         self.current_samples = None
         dpg.set_value("series", [[], []])
+        self._last_fit_key = None
+        self._last_fit_y = None
         self.set_status("Cleared.")
         self._set_record_visual_idle()
         self._post_record_flash_until = 0.0
@@ -481,32 +864,110 @@ class App:
 
     def run(self):
         while dpg.is_dearpygui_running():
+            # Cap the frame rate; there is little to redraw outside recording
+            target_dt = 1 / 60 if self._recording else 1 / 30
+            frame_start = time.perf_counter()
             self._update_animation()
             dpg.render_dearpygui_frame()
+            if self._axis_limits_pending:
+                dpg.set_axis_limits_auto("xaxis")
+                dpg.set_axis_limits_auto("yaxis")
+                self._axis_limits_pending = False
             self._drain_queue()
+            self._flush_status()
+            slack = target_dt - (time.perf_counter() - frame_start)
+            if slack > 0:
+                time.sleep(slack)
+        self._stop_playback()
         dpg.destroy_context()
 
     # ---------- Background helpers ----------
 
-    def _record_worker(self, sr: int, dur: float):
+    def _record_worker(self, sr: int, dur: float, idx: int):
         ser = self.ser
         if ser is None:
             self._result_queue.put((None, sr, RuntimeError("Serial port disconnected.")))
             return
+        n = int(round(sr * dur))
+        if self._audio_bufs[idx].size < n:
+            self._audio_bufs[idx] = np.empty(n, dtype=np.int16)
         try:
-            data = rec_once(ser, sr, dur)
+            data = rec_once(ser, sr, dur, out=self._audio_bufs[idx])
         except Exception as exc:
             self._result_queue.put((None, sr, exc))
             return
         self._result_queue.put((data, sr, None))
 
+    def _playback_worker(self, stream, data: np.ndarray, stop: threading.Event):
+        try:
+            for start in range(0, len(data), PLAY_BLOCK):
+                if stop.is_set():
+                    stream.abort()
+                    return
+                stream.write(data[start:start + PLAY_BLOCK])
+            stream.stop()  # returns once the queued audio has played
+        except Exception as exc:
+            self.set_status(f"Playback error: {exc}")
+        finally:
+            stream.close()
+            stop.set()
+
+    def _start_ports_refresh(self):
+        if self._ports_thread is not None and self._ports_thread.is_alive():
+            # Rescan once the running scan is done; it may predate the change
+            self._ports_stale = True
+            return
+        self._ports_stale = False
+        thread = threading.Thread(target=self._refresh_ports_bg, daemon=True)
+        self._ports_thread = thread
+        thread.start()
+
+    def _refresh_ports_bg(self):
+        try:
+            labels, devs = list_serial_ports()
+        except Exception as exc:
+            self._ports_queue.put(([], [], exc))
+            return
+        self._ports_queue.put((labels, devs, None))
+
+    def _start_hotplug_monitor(self):
+        # Optional: on Linux with pyudev installed, rescan ports when a tty
+        # device appears or disappears. Elsewhere the Refresh button does it.
+        try:
+            import pyudev
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by(subsystem="tty")
+            observer = pyudev.MonitorObserver(monitor, callback=self._on_hotplug)
+            observer.start()
+        except Exception:
+            return
+        self._hotplug_observer = observer
+
+    def _on_hotplug(self, device):
+        # Runs on the pyudev thread; the render loop picks the flag up
+        self._ports_stale = True
+
     def _drain_queue(self):
-        while True:
-            try:
-                data, sr, exc = self._result_queue.get_nowait()
-            except queue.Empty:
-                break
+        if self._ports_stale:
+            self._start_ports_refresh()
+        # Checking empty() first keeps idle frames free of queue.Empty raises
+        while not self._result_queue.empty():
+            data, sr, exc = self._result_queue.get_nowait()
             self._finish_recording(data, sr, exc)
+        while not self._ports_queue.empty():
+            labels, devs, exc = self._ports_queue.get_nowait()
+            self._finish_ports_refresh(labels, devs, exc)
+
+    def _finish_ports_refresh(self, labels: list, devs: list, error: Optional[Exception]):
+        announce = self._announce_ports
+        self._announce_ports = False
+        if error is not None:
+            self.set_status(f"Port scan error: {error}")
+            return
+        self.ports_labels, self.ports_devices = labels, devs
+        dpg.configure_item("port_combo", items=labels)
+        if announce:
+            self.set_status("Ports refreshed.")
 
     def _update_animation(self):
         now = time.perf_counter()
@@ -515,49 +976,82 @@ class App:
             dt = 0.0
         self._last_frame_time = now
 
+        animating = self._recording or self._post_record_flash_until or self._connected_pulse_active
+        if not animating:
+            # Nothing is pulsing; only make sure the static color is in place
+            self._set_cached("conn_indicator", _CONN_DISCONNECTED, "color")
+            return
+
         if self._recording:
-            self._record_pulse = (self._record_pulse + dt * 3.2) % (2 * math.pi)
-            intensity = 0.5 + 0.5 * math.sin(self._record_pulse)
-            record_color = []
-            for i in range(3):
-                base = self._record_color_recording[i]
-                record_color.append(int(base + (255 - base) * intensity * 0.6))
-            dpg.configure_item("record_indicator", color=(*record_color, 255))
+            self._record_pulse = (self._record_pulse + dt * _RECORD_PULSE_STEPS) % _LUT_SIZE
+            self._set_cached("record_indicator", _RECORDING_LUT[int(self._record_pulse)], "color")
 
             if self._record_duration > 0.0:
                 progress = (now - self._record_start_time) / self._record_duration
             else:
                 progress = 0.0
             progress = max(0.0, min(progress, 0.99))
-            dpg.set_value("record_progress", progress)
-            dpg.configure_item("record_progress", overlay=f"{progress * 100:.0f}%")
+            self._set_cached("record_progress", progress)
+            self._set_cached("record_progress", f"{progress * 100:.0f}%", "overlay")
         else:
             if self._post_record_flash_until > now and self._post_record_flash_duration > 0:
                 ratio = (self._post_record_flash_until - now) / self._post_record_flash_duration
                 ratio = max(0.0, min(1.0, ratio))
-                faded_color = []
-                for i in range(3):
-                    idle = self._record_color_idle[i]
-                    flash = self._post_record_flash_color[i]
-                    faded_color.append(int(idle + (flash - idle) * ratio))
-                dpg.configure_item("record_indicator", color=(*faded_color, 255))
+                lut = _FADE_LUTS[self._post_record_flash_color]
+                self._set_cached("record_indicator", lut[int(ratio * (_LUT_SIZE - 1))], "color")
             elif self._post_record_flash_until:
                 self._post_record_flash_until = 0.0
                 self._post_record_flash_duration = 0.0
-                self._post_record_flash_color = self._record_color_idle
-                dpg.configure_item("record_indicator", color=self._record_color_idle)
-
-        base_conn = self._conn_color_connected if self._connected else self._conn_color_disconnected
-        mix_conn = (180, 235, 200) if self._connected else (255, 160, 160)
-        speed = 1.25 if self._connected else 0.8
-        self._conn_pulse = (self._conn_pulse + dt * speed) % (2 * math.pi)
-        conn_wave = 0.5 + 0.5 * math.sin(self._conn_pulse)
-        conn_color = []
-        for i in range(3):
-            base = base_conn[i]
-            mix = mix_conn[i]
-            conn_color.append(int(base + (mix - base) * conn_wave * 0.6))
-        dpg.configure_item("conn_indicator", color=(*conn_color, 255))
+                self._post_record_flash_color = _RECORD_IDLE
+                self._set_cached("record_indicator", _RECORD_IDLE, "color")
+
+        if not self._connected_pulse_active:
+            self._set_cached("conn_indicator", _CONN_DISCONNECTED, "color")
+            return
+        self._conn_pulse = (self._conn_pulse + dt * _CONN_PULSE_STEPS) % _LUT_SIZE
+        self._set_cached("conn_indicator", _CONN_LUT[int(self._conn_pulse)], "color")
+
+    def _plot_waveform(self, data: np.ndarray, sr: int):
+        if len(data) > PLOT_MAX_POINTS:
+            m = PLOT_MAX_POINTS
+            _downsample_minmax(data, out=self._plot_y)
+        else:
+            m = len(data)
+            self._plot_y[:m] = data
+        y = self._plot_y[:m]
+        key = (len(data), sr)
+        if key != self._plot_x_key:
+            self._plot_x[:m] = _time_axis(len(data), sr, m)
+            self._plot_x_key = key
+        limits = None
+        if len(y):
+            # Limits come from the (already reduced) series instead of
+            # letting ImPlot scan the data with fit_axis_data.
+            y_lo, y_hi = float(y.min()), float(y.max())
+            # A take of the same shape whose extremes moved by no more than
+            # the last fit's padding is still fully in view, so that view
+            # (and any zoom) is kept instead of refitted.
+            last_y = self._last_fit_y
+            if (
+                key != self._last_fit_key
+                or last_y is None
+                or abs(y_lo - last_y[0]) > last_y[2]
+                or abs(y_hi - last_y[1]) > last_y[2]
+            ):
+                pad = max((y_hi - y_lo) * 0.05, 1.0)
+                t_max = max((len(data) - 1) / float(sr), 1.0 / sr)
+                limits = (t_max, y_lo - pad, y_hi + pad)
+                self._last_fit_key = key
+                self._last_fit_y = (y_lo, y_hi, pad)
+        # Push the series and its limits as one batch under DPG's lock
+        with dpg.mutex():
+            _set_line_series("series", self._plot_x[:m], y)
+            if limits is not None:
+                dpg.set_axis_limits("xaxis", 0.0, limits[0])
+                dpg.set_axis_limits("yaxis", limits[1], limits[2])
+        # Limits are applied on the next rendered frame; freeing them right
+        # after that keeps the plot zoomable.
+        self._axis_limits_pending = limits is not None
 
     def _finish_recording(self, data: Optional[np.ndarray], sr: int, error: Optional[Exception]):
         self._record_thread = None
@@ -581,12 +1075,11 @@ class App:
 
         self.current_samples = data
         self.current_sr = sr
-        t = np.arange(len(data)) / float(sr)
-        dpg.set_value("series", [t.tolist(), data.astype(float).tolist()])
-        dpg.fit_axis_data("xaxis")
-        dpg.fit_axis_data("yaxis")
-        dpg.set_value("record_progress", 1.0)
-        dpg.configure_item("record_progress", overlay="100%")
+        # The next capture fills the other buffer
+        self._fill_idx ^= 1
+        self._plot_waveform(data, sr)
+        self._set_cached("record_progress", 1.0)
+        self._set_cached("record_progress", "100%", "overlay")
         self._set_record_visual_success()
         self._post_record_flash_duration = 1.5
         self._post_record_flash_until = time.perf_counter() + 1.5
@@ -1,20 +1,27 @@
+import os
 import struct
 import sys
+import threading
+import wave
 from pathlib import Path
 
 import numpy as np
+import pytest
+import serial
+import dearpygui.dearpygui as dpg
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
-from gui.main import rec_once
+import gui.main as gui_main
+from gui.main import App, SerialReader, _downsample_minmax, _time_axis, list_serial_ports, rec_once, write_wav
 
 
 class DummySerial:
-    def __init__(self, payload: tuple[int, ...], timeout):
+    def __init__(self, payload: tuple[int, ...], timeout, header: bytes = b"", ack: bytes = b"ACK\n"):
         self._timeout = timeout
-        self._readline_queue = [b"ACK\n", f"DATA,{len(payload)}\n".encode()]
-        self._payload = struct.pack("<" + "h" * len(payload), *payload)
-        self._payload_pos = 0
+        header = ack + (header or struct.pack("<4sI", b"DATA", len(payload)))
+        self._stream = header + struct.pack("<" + "h" * len(payload), *payload) + b"DONE\n"
+        self._pos = 0
         self.written = []
 
     @property
@@ -25,6 +32,10 @@ class DummySerial:
     def timeout(self, value):
         self._timeout = value
 
+    @property
+    def in_waiting(self):
+        return len(self._stream) - self._pos if self.written else 0
+
     def reset_input_buffer(self):
         pass
 
@@ -37,19 +48,26 @@ class DummySerial:
     def flush(self):
         pass
 
+    def close(self):
+        pass
+
+    def read(self, size=1):
+        # Like the device, nothing is sent until a command has been written
+        if not self.written:
+            return b""
+        chunk = self._stream[self._pos : self._pos + size]
+        self._pos += len(chunk)
+        return chunk
+
     def readline(self):
-        if self._readline_queue:
-            return self._readline_queue.pop(0)
-        return b""
+        end = self._stream.find(b"\n", self._pos)
+        end = len(self._stream) if end == -1 else end + 1
+        return self.read(end - self._pos)
 
     def readinto(self, mv):
-        remaining = len(self._payload) - self._payload_pos
-        if remaining <= 0:
-            return 0
-        count = min(remaining, len(mv))
-        mv[:count] = self._payload[self._payload_pos : self._payload_pos + count]
-        self._payload_pos += count
-        return count
+        chunk = self.read(len(mv))
+        mv[: len(chunk)] = chunk
+        return len(chunk)
 
 
 def _run_rec_once_with_timeout(initial_timeout):
@@ -70,3 +88,206 @@ def test_rec_once_restores_timeout_none():
     ser, samples, payload = _run_rec_once_with_timeout(None)
     assert ser.timeout is None
     np.testing.assert_array_equal(samples, np.array(payload, dtype=np.int16))
+
+
+def test_downsample_minmax_keeps_bucket_extremes():
+    data = np.zeros(4096, dtype=np.int16)
+    data[10] = 1000
+    data[3000] = -1000
+    y = _downsample_minmax(data, target=64)
+    assert len(y) == 64
+    assert y.max() == 1000
+    assert y.min() == -1000
+
+
+def test_time_axis_spans_capture():
+    t = _time_axis(16000, sr=8000, points=2048)
+    assert t.dtype == np.float32
+    assert len(t) == 2048
+    assert t[0] == 0.0
+    assert t[-1] == np.float32(15999 / 8000)
+
+
+def test_rec_once_reports_device_error():
+    ser = DummySerial((), timeout=0.1, header=b"ERR,BUF\r\n")
+    with pytest.raises(RuntimeError, match="ERR,BUF"):
+        rec_once(ser, sr=4, seconds=1.0)
+
+
+def test_rec_once_firmware_ack_line():
+    payload = (9, -8, 7, -6)
+    ser = DummySerial(payload, timeout=1.0, ack=b"ACK\r\n")
+    samples = rec_once(ser, sr=4, seconds=1.0)
+    np.testing.assert_array_equal(samples, np.array(payload, dtype=np.int16))
+
+
+def test_rec_once_reports_error_after_ack():
+    ser = DummySerial((), timeout=0.1, header=b"ERR,BUF\r\n", ack=b"ACK\r\n")
+    with pytest.raises(RuntimeError, match="ERR,BUF"):
+        rec_once(ser, sr=4, seconds=1.0)
+
+
+def test_rec_once_returns_writable_array():
+    _, samples, _ = _run_rec_once_with_timeout(1.0)
+    assert samples.dtype == np.int16
+    assert samples.flags.writeable
+
+
+def test_rec_once_reuses_output_buffer():
+    payload = (5, -6, 7)
+    ser = DummySerial(payload, timeout=1.0)
+    out = np.zeros(8, dtype=np.int16)
+    samples = rec_once(ser, sr=3, seconds=1.0, out=out)
+    assert np.shares_memory(samples, out)
+    np.testing.assert_array_equal(samples, np.array(payload, dtype=np.int16))
+
+
+def test_list_serial_ports_prefers_usb(monkeypatch):
+    class Port:
+        def __init__(self, device, description):
+            self.device = device
+            self.description = description
+
+    ports = [Port("/dev/ttyS0", None), Port("/dev/ttyACM0", "XIAO USB CDC")]
+    monkeypatch.setattr("gui.main.list_ports.comports", lambda: ports)
+    labels, devices = list_serial_ports()
+    assert devices == ["/dev/ttyACM0", "/dev/ttyS0"]
+    assert labels == ["/dev/ttyACM0 — XIAO USB CDC", "/dev/ttyS0"]
+
+
+def test_rec_once_rejects_oversized_header():
+    ser = DummySerial((), timeout=0.1, header=struct.pack("<4sI", b"DATA", 999999999))
+    with pytest.raises(RuntimeError, match="Malformed DATA header"):
+        rec_once(ser, sr=4, seconds=1.0)
+
+
+def test_downsample_minmax_covers_ragged_tail():
+    data = np.zeros(4100, dtype=np.int16)
+    data[-1] = 500
+    y = _downsample_minmax(data, target=64)
+    assert len(y) == 64
+    assert y[-1] == 500
+
+
+def test_downsample_minmax_writes_into_out():
+    data = np.arange(4096, dtype=np.int16)
+    out = np.zeros(64, dtype=np.float32)
+    y = _downsample_minmax(data, target=64, out=out)
+    assert np.shares_memory(y, out)
+    assert out[0] == 0
+    assert out[-1] == 4095
+
+
+def test_rec_once_through_serial_reader():
+    payload = tuple(range(-50, 50))
+    reader = SerialReader(DummySerial(payload, timeout=1.0))
+    try:
+        samples = rec_once(reader, sr=100, seconds=1.0)
+    finally:
+        reader.close()
+    np.testing.assert_array_equal(samples, np.array(payload, dtype=np.int16))
+
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a POSIX pty")
+def test_serial_reader_reads_descriptor_directly():
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    reader = SerialReader(serial.Serial(os.ttyname(slave), timeout=1.0))
+    try:
+        os.write(master, b"ACK\r\n")
+        assert reader.read(5) == b"ACK\r\n"
+    finally:
+        reader.close()
+        os.close(master)
+        os.close(slave)
+
+
+def test_write_wav_round_trip(tmp_path):
+    samples = np.array([0, 1, -1, 32767, -32768], dtype=np.int16)
+    path = tmp_path / "take.wav"
+    write_wav(str(path), samples, 8000)
+    with wave.open(str(path), "rb") as wf:
+        assert wf.getnchannels() == 1
+        assert wf.getsampwidth() == 2
+        assert wf.getframerate() == 8000
+        frames = wf.readframes(wf.getnframes())
+    np.testing.assert_array_equal(np.frombuffer(frames, dtype="<i2"), samples)
+
+
+def test_write_wav_empty(tmp_path):
+    path = tmp_path / "empty.wav"
+    write_wav(str(path), np.zeros(0, dtype=np.int16), 8000)
+    with wave.open(str(path), "rb") as wf:
+        assert wf.getnframes() == 0
+
+
+@pytest.fixture
+def app(monkeypatch):
+    for name in ("create_viewport", "setup_dearpygui", "show_viewport", "set_primary_window"):
+        monkeypatch.setattr(dpg, name, lambda *a, **k: None)
+    app = App()
+    yield app
+    dpg.destroy_context()
+
+
+def test_plot_waveform_keeps_view_for_similar_takes(app, monkeypatch):
+    fits = []
+    monkeypatch.setattr(dpg, "set_axis_limits", lambda *a: fits.append(a))
+    take = (np.sin(np.arange(16000) / 10) * 1000).astype(np.int16)
+    app._plot_waveform(take, 8000)
+    assert len(fits) == 2
+    # Slightly different extremes, as from ADC noise: no refit
+    app._plot_waveform((take * 1.02).astype(np.int16), 8000)
+    assert len(fits) == 2
+    # A clearly larger range or another sample rate refits
+    app._plot_waveform(take * 2, 8000)
+    assert len(fits) == 4
+    app._plot_waveform(take * 2, 4000)
+    assert len(fits) == 6
+
+
+def test_failed_capture_keeps_previous_sample_rate(app, monkeypatch):
+    take = np.arange(100, dtype=np.int16)
+    app._finish_recording(take, 8000, None)
+    started, release = threading.Event(), threading.Event()
+
+    def failing_rec_once(ser, sr, seconds, out=None):
+        started.set()
+        release.wait(5)
+        raise TimeoutError("no data")
+
+    monkeypatch.setattr(gui_main, "rec_once", failing_rec_once)
+    app.ser = object()
+    dpg.set_value("sr", 4000)
+    dpg.set_value("dur", 1.0)
+    app.on_record()
+    assert started.wait(5)
+    # While the new take is in flight the old one keeps its own rate
+    assert app.current_sr == 8000
+    release.set()
+    app._record_thread.join(5)
+    app._drain_queue()
+    assert app.current_samples is take
+    assert app.current_sr == 8000
+
+
+def test_finished_playback_is_forgotten(app):
+    class FakeStream:
+        def write(self, block):
+            pass
+
+        def stop(self):
+            pass
+
+        def close(self):
+            pass
+
+    data = np.zeros(3000, dtype=np.int16)
+    stop = threading.Event()
+    app._play_stop, app._play_data = stop, data
+    app._playback_worker(FakeStream(), data, stop)
+    assert stop.is_set()
+    assert app._active_play_data() is None
+    assert app._play_stop is None